@@ -1,62 +1,195 @@
 import google.generativeai as genai
 import os
-import json
+import re
+import orjson
+import numpy as np
+
+try:
+    from . import cache
+except ImportError:
+    from api import cache
 
 # Configure Gemini
 api_key = os.environ.get("GEMINI_API_KEY")
 if api_key:
     genai.configure(api_key=api_key)
 
-async def get_gemini_response(prompt: str):
+# Build the model once at import; warm invocations reuse it
+model = genai.GenerativeModel('gemini-1.5-flash')
+
+# Cache TTLs (seconds)
+ANALYZE_CACHE_TTL = 24 * 3600
+CHAT_CACHE_TTL = 3600
+
+# Grabs the outermost JSON object even if Gemini wraps it in prose or markdown
+JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+JSON_CONFIG = {"response_mime_type": "application/json"}
+
+# --- PROMPT TEMPLATES (built once, filled per request) ---
+RESUME_CHAR_LIMIT = 2000
+
+ANALYZE_TEMPLATE = (
+    "Act as an ATS Scanner. Compare this Resume and Job Description (JD).\n"
+    "Resume: {resume}...\n"
+    "JD: {jd}...\n\n"
+    "Output ONLY valid JSON format:\n"
+    "{{\n"
+    '    "match_score": (integer 0-100),\n'
+    '    "missing_keywords": ["list", "of", "missing", "skills"],\n'
+    '    "advice": "1 sentence advice"\n'
+    "}}\n"
+)
+
+COLD_EMAIL_TEMPLATE = (
+    "Write a professional, concise cold email to a recruiter for this Job Description.\n"
+    "My Role: {role}\n"
+    "Job Description: {jd}\n\n"
+    "Output ONLY the email body text. No subject line placeholders.\n"
+)
+
+# Used once the match score comes from embeddings; Gemini only critiques
+CRITIQUE_TEMPLATE = (
+    "Act as an ATS Scanner. Compare this Resume excerpt and Job Description (JD).\n"
+    "Resume: {resume}...\n"
+    "JD: {jd}...\n\n"
+    "Output ONLY valid JSON format:\n"
+    "{{\n"
+    '    "missing_keywords": ["list", "of", "missing", "skills"],\n'
+    '    "advice": "1 sentence advice"\n'
+    "}}\n"
+)
+CRITIQUE_CHAR_LIMIT = 800
+
+CHAT_TEMPLATE = (
+    "You are a helpful Career Coach assistant named 'SmartIntern'.\n"
+    "Context: {context}\n\n"
+    "User: {message}\n"
+    "Assistant:\n"
+)
+
+async def _generate(prompt: str, generation_config: dict = None):
+    # Async call so the event loop isn't blocked during the Gemini round-trip
+    response = await model.generate_content_async(prompt, generation_config=generation_config)
+    return response.text
+
+async def get_gemini_response(prompt: str, generation_config: dict = None):
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        return response.text
+        return await _generate(prompt, generation_config)
     except Exception as e:
         return str(e)
 
-async def analyze_resume_ai(resume_text: str, job_desc: str):
-    prompt = f"""
-    Act as an ATS Scanner. Compare this Resume and Job Description (JD).
-    Resume: {resume_text[:2000]}...
-    JD: {job_desc[:2000]}...
-    
-    Output ONLY valid JSON format:
-    {{
-        "match_score": (integer 0-100),
-        "missing_keywords": ["list", "of", "missing", "skills"],
-        "advice": "1 sentence advice"
-    }}
-    """
-    raw_text = await get_gemini_response(prompt)
-    # Cleanup JSON (remove markdown ticks)
-    clean_json = raw_text.replace("```json", "").replace("```", "").strip()
+def parse_json_reply(raw_text: str):
+    """
+    Returns the JSON object embedded in a Gemini reply, or None if there isn't a valid one.
+    """
+    match = JSON_RE.search(raw_text)
+    if not match:
+        return None
     try:
-        return json.loads(clean_json)
-    except:
+        return orjson.loads(match.group(0))
+    except orjson.JSONDecodeError:
+        return None
+
+class StreamError(str):
+    """
+    Error text yielded by stream_gemini. It is still a str so it can be sent
+    to the client, but callers can tell it apart from real output.
+    """
+
+async def stream_gemini(prompt: str):
+    """
+    Yields Gemini output chunk by chunk so clients see the first tokens immediately.
+    A failure ends the stream with a StreamError chunk.
+    """
+    try:
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+    except Exception as e:
+        yield StreamError(e)
+
+async def analyze_resume_ai(resume_text: str, job_desc: str, user: str = ""):
+    prompt = ANALYZE_TEMPLATE.format_map({
+        "resume": resume_text[:RESUME_CHAR_LIMIT],
+        "jd": job_desc[:RESUME_CHAR_LIMIT],
+    })
+    # Exact hits only: a different resume must never reuse another's score
+    cached, _ = await cache.lookup("analyze", prompt, scope=(user,))
+    if cached is not None:
+        return cached
+
+    analysis = parse_json_reply(await get_gemini_response(prompt, JSON_CONFIG))
+    if analysis is None:
         return {"match_score": 0, "missing_keywords": [], "advice": "Error parsing AI response"}
+    await cache.store("analyze", prompt, analysis, ANALYZE_CACHE_TTL, scope=(user,))
+    return analysis
 
-async def generate_cold_email_ai(job_desc: str, user_role: str = "Developer"):
-    prompt = f"""
-    Write a professional, concise cold email to a recruiter for this Job Description.
-    My Role: {user_role}
-    Job Description: {job_desc}
-    
-    Output ONLY the email body text. No subject line placeholders.
+async def embed_text(text: str):
     """
-    return await get_gemini_response(prompt)
+    Returns the embedding vector for text, or None if the call fails.
+    """
+    try:
+        result = await genai.embed_content_async(model=cache.EMBED_MODEL, content=text[:RESUME_CHAR_LIMIT])
+        return result["embedding"]
+    except Exception as e:
+        print(f"Embedding Error: {e}")
+        return None
 
-async def chat_with_gemini(message: str, context: str = ""):
+async def analyze_with_embedding(resume_embedding: list, resume_text: str, job_desc: str, user: str = ""):
+    """
+    Cheaper re-analysis for a resume that was already embedded: the match score
+    is cosine similarity * 100 with the JD (not calibrated to the Gemini ATS
+    score), and Gemini gets a trimmed prompt. Falls back to the full analysis
+    if either vector is unusable.
     """
-    General AI Assistant Chat. 
+    jd_embedding = await embed_text(job_desc)
+    if jd_embedding is None or len(resume_embedding) != cache.EMBED_DIM or len(jd_embedding) != cache.EMBED_DIM:
+        return await analyze_resume_ai(resume_text, job_desc, user)
+
+    resume_vec = np.asarray(resume_embedding, dtype=np.float32)
+    jd_vec = np.asarray(jd_embedding, dtype=np.float32)
+    norms = float(np.linalg.norm(resume_vec) * np.linalg.norm(jd_vec))
+    if not np.isfinite(norms) or norms == 0:
+        return await analyze_resume_ai(resume_text, job_desc, user)
+    similarity = float(resume_vec @ jd_vec) / norms
+    match_score = int(round(max(0.0, similarity) * 100))
+
+    prompt = CRITIQUE_TEMPLATE.format_map({
+        "resume": resume_text[:CRITIQUE_CHAR_LIMIT],
+        "jd": job_desc[:CRITIQUE_CHAR_LIMIT],
+    })
+    critique = parse_json_reply(await get_gemini_response(prompt, JSON_CONFIG))
+    if critique is None:
+        critique = {"missing_keywords": [], "advice": "Error parsing AI response"}
+    return {
+        "match_score": match_score,
+        "missing_keywords": critique.get("missing_keywords", []),
+        "advice": critique.get("advice", ""),
+    }
+
+async def generate_cold_email_ai(job_desc: str, user_role: str = "Developer"):
+    prompt = COLD_EMAIL_TEMPLATE.format_map({"role": user_role, "jd": job_desc})
+    async for text in stream_gemini(prompt):
+        yield text
+
+async def chat_with_gemini(message: str, context: str = "", user: str = ""):
     """
-    system_instruction = "You are a helpful Career Coach assistant named 'SmartIntern'."
-    
-    prompt = f"""
-    {system_instruction}
-    Context: {context}
-    
-    User: {message}
-    Assistant:
+    General AI Assistant Chat (streamed).
     """
-    return await get_gemini_response(prompt)
\ No newline at end of file
+    context = context or ""
+    prompt = CHAT_TEMPLATE.format_map({"context": context, "message": message})
+    # Semantic matches are limited to the same user and context, and compare the message only
+    scope = (user, context)
+    cached, embedding = await cache.lookup("chat", prompt, scope=scope, query=message)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
+    async for text in stream_gemini(prompt):
+        yield text
+        if isinstance(text, StreamError):
+            return
+        chunks.append(text)
+    # Only cache complete replies
+    await cache.store("chat", prompt, "".join(chunks), CHAT_CACHE_TTL, scope=scope, query=message, embedding=embedding)
@@ -0,0 +1,125 @@
+import google.generativeai as genai
+import redis.asyncio as redis
+import hashlib
+import json
+import os
+import struct
+
+# Two-tier AI response cache:
+#   1. Exact hit    -> GET ai:exact:{namespace}:{sha256(scope + prompt)}
+#   2. Semantic hit -> RediSearch KNN over an embedding of the caller's variable
+#                      input only (never the template), filtered to the same scope
+# The semantic tier is opt-in per call (pass `query`), so callers whose answers
+# depend on every character of the input stay exact-only.
+# Every Redis failure is swallowed so the AI endpoints keep working without a cache.
+
+EMBED_MODEL = "models/text-embedding-004"
+EMBED_DIM = 768
+SIMILARITY_THRESHOLD = 0.95
+INDEX_NAME = "ai_semantic_idx_v2"
+EXACT_PREFIX = "ai:exact:"
+SEMANTIC_PREFIX = "ai:sem:"
+
+redis_url = os.environ.get("REDIS_URL")
+client = redis.from_url(redis_url) if redis_url else None
+_index_ready = False
+# Flipped off for good if the server has no RediSearch module
+_semantic_enabled = True
+
+def _normalize(text: str):
+    # Collapse whitespace so indentation changes don't break exact hits
+    return " ".join(text.split())
+
+def _hash(*parts: str):
+    return hashlib.sha256("\x00".join(_normalize(p) for p in parts).encode()).hexdigest()
+
+async def _ensure_index():
+    global _index_ready, _semantic_enabled
+    if _index_ready:
+        return True
+    try:
+        await client.execute_command(
+            "FT.CREATE", INDEX_NAME, "ON", "HASH", "PREFIX", "1", SEMANTIC_PREFIX,
+            "SCHEMA",
+            "namespace", "TAG",
+            "scope", "TAG",
+            "embedding", "VECTOR", "HNSW", "6",
+            "TYPE", "FLOAT32", "DIM", str(EMBED_DIM), "DISTANCE_METRIC", "COSINE",
+        )
+    except redis.ResponseError as e:
+        message = str(e).lower()
+        if "unknown command" in message:
+            print("⚠️ WARNING: RediSearch not available, semantic cache disabled")
+            _semantic_enabled = False
+            return False
+        if "already exists" not in message:
+            raise
+    _index_ready = True
+    return True
+
+async def _embed(text: str):
+    result = await genai.embed_content_async(model=EMBED_MODEL, content=_normalize(text))
+    return struct.pack(f"{EMBED_DIM}f", *result["embedding"])
+
+async def lookup(namespace: str, prompt: str, scope: tuple = (), query: str = None):
+    """
+    Returns (cached_value, embedding). cached_value is None on a miss;
+    pass the embedding back to store() so the query isn't embedded twice.
+    `scope` (e.g. user email) partitions both tiers; `query` enables the
+    semantic tier and is the only text that gets embedded.
+    """
+    if client is None:
+        return None, None
+    embedding = None
+    try:
+        prompt_hash = _hash(*scope, prompt)
+        cached = await client.get(f"{EXACT_PREFIX}{namespace}:{prompt_hash}")
+        if cached is not None:
+            return json.loads(cached), None
+
+        if query is None or not _semantic_enabled or not await _ensure_index():
+            return None, None
+        embedding = await _embed(query)
+        res = await client.execute_command(
+            "FT.SEARCH", INDEX_NAME,
+            f"(@namespace:{{{namespace}}} @scope:{{{_hash(*scope)}}})=>[KNN 1 @embedding $vec AS distance]",
+            "PARAMS", "2", "vec", embedding,
+            "SORTBY", "distance",
+            "RETURN", "2", "value", "distance",
+            "DIALECT", "2",
+        )
+        # res = [total, key, [field, value, field, value]]
+        if res and res[0] > 0:
+            fields = dict(zip(res[2][::2], res[2][1::2]))
+            similarity = 1 - float(fields[b"distance"])
+            if similarity >= SIMILARITY_THRESHOLD:
+                return json.loads(fields[b"value"]), embedding
+    except Exception as e:
+        print(f"Cache Lookup Error: {e}")
+    return None, embedding
+
+async def store(namespace: str, prompt: str, value, ttl: int, scope: tuple = (), query: str = None, embedding: bytes = None):
+    if client is None:
+        return
+    try:
+        prompt_hash = _hash(*scope, prompt)
+        payload = json.dumps(value)
+        await client.set(f"{EXACT_PREFIX}{namespace}:{prompt_hash}", payload, ex=ttl)
+        if query is None or not _semantic_enabled or not await _ensure_index():
+            return
+        if embedding is None:
+            embedding = await _embed(query)
+        sem_key = f"{SEMANTIC_PREFIX}{namespace}:{prompt_hash}"
+        await client.hset(sem_key, mapping={
+            "namespace": namespace,
+            "scope": _hash(*scope),
+            "value": payload,
+            "embedding": embedding,
+        })
+        await client.expire(sem_key, ttl)
+    except Exception as e:
+        print(f"Cache Store Error: {e}")
+
+async def close():
+    if client is not None:
+        await client.aclose()
@@ -1,32 +1,55 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie, PydanticObjectId
 from contextlib import asynccontextmanager
+from functools import lru_cache
+from anyio import to_thread
+from pymongo.errors import DuplicateKeyError
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
 import os
 
 # --- SAFE IMPORTS (Fixes Vercel 500 Error) ---
 try:
     # Try relative imports (Works locally)
-    from .models import Application, User, UserAuth, Token
+    from .models import Application, ApplicationCreate, ApplicationDetail, ApplicationListItem, AppIdCompany, User, UserAuth, Token
     from .auth import get_password_hash, verify_password, create_access_token, get_current_user
-    from .ai_utils import analyze_resume_ai, generate_cold_email_ai, chat_with_gemini
+    from . import cache
+    from .ai_utils import analyze_resume_ai, analyze_with_embedding, embed_text, generate_cold_email_ai, chat_with_gemini
 except ImportError:
     # Try absolute imports (Works on Vercel)
-    from api.models import Application, User, UserAuth, Token
+    from api.models import Application, ApplicationCreate, ApplicationDetail, ApplicationListItem, AppIdCompany, User, UserAuth, Token
     from api.auth import get_password_hash, verify_password, create_access_token, get_current_user
-    from api.ai_utils import analyze_resume_ai, generate_cold_email_ai, chat_with_gemini
+    from api import cache
+    from api.ai_utils import analyze_resume_ai, analyze_with_embedding, embed_text, generate_cold_email_ai, chat_with_gemini
+
+# --- DATABASE CLIENT (Reused across warm invocations) ---
+@lru_cache(maxsize=1)
+def get_client():
+    return AsyncIOMotorClient(
+        os.environ["MONGODB_URL"],
+        maxPoolSize=10,
+        minPoolSize=1,
+        maxIdleTimeMS=30000,
+        serverSelectionTimeoutMS=3000,
+    )
 
 # --- LIFESPAN (Database Connection) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Thread pool used for CPU-bound work like password hashing
+    to_thread.current_default_thread_limiter().total_tokens = 32
     mongo_url = os.environ.get("MONGODB_URL")
+    client = None
     if mongo_url:
         try:
-            client = AsyncIOMotorClient(mongo_url)
+            client = get_client()
             # Initialize Beanie with all models
             await init_beanie(database=client["smart_intern_tracker"], document_models=[Application, User])
             print("✅ Database Connected")
@@ -34,7 +57,14 @@ async def lifespan(app: FastAPI):
             print(f"❌ Database Connection Error: {e}")
     else:
         print("⚠️ WARNING: MONGODB_URL not found")
-    yield
+    try:
+        yield
+    finally:
+        # Release pooled sockets and monitor threads on shutdown
+        if client is not None:
+            client.close()
+            get_client.cache_clear()
+        await cache.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -47,6 +77,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- COMPRESSION (Resume/JD-heavy responses) ---
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """
+    GZip that skips the given paths. Used for streamed AI replies: older
+    Starlette buffers gzip output and would hold back the first tokens.
+    Current Starlette already flushes each chunk with Z_SYNC_FLUSH, so there
+    the exclusion only saves the CPU of compressing tiny chunks.
+    """
+    def __init__(self, app, exclude_paths=(), **kwargs):
+        super().__init__(app, **kwargs)
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    minimum_size=1024,
+    exclude_paths=["/api/ai/chat", "/api/ai/cold-email"],
+)
+
 # --- ROUTES ---
 
 @app.get("/api/health")
@@ -57,14 +111,14 @@ def health_check():
 @app.post("/api/auth/signup")
 async def signup(user_data: UserAuth):
     try:
-        existing_user = await User.find_one(User.email == user_data.email)
-        if existing_user:
-            raise HTTPException(status_code=400, detail="Email already registered")
-        
-        hashed_pw = get_password_hash(user_data.password)
+        # bcrypt is CPU-bound; keep it off the event loop
+        hashed_pw = await to_thread.run_sync(get_password_hash, user_data.password)
         new_user = User(email=user_data.email, hashed_password=hashed_pw)
+        # Unique index on email rejects duplicates in the same round-trip
         await new_user.insert()
         return {"message": "User created"}
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     except Exception as e:
         print(f"Signup Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -72,22 +126,29 @@ async def signup(user_data: UserAuth):
 @app.post("/api/auth/login", response_model=Token)
 async def login(user_data: UserAuth):
     user = await User.find_one(User.email == user_data.email)
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    if not user or not await to_thread.run_sync(verify_password, user_data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 # 2. APPLICATIONS CRUD (Protected)
-@app.get("/api/applications")
+@app.get("/api/applications", response_model=list[ApplicationListItem])
 async def get_apps(current_user: str = Depends(get_current_user)):
-    return await Application.find(Application.user_email == current_user).to_list()
+    return await Application.find(Application.user_email == current_user).project(ApplicationListItem).to_list()
 
-@app.post("/api/applications")
-async def create_app(app_data: Application, current_user: str = Depends(get_current_user)):
-    app_data.user_email = current_user 
-    await app_data.insert()
-    return app_data
+@app.get("/api/applications/{id}", response_model=ApplicationDetail)
+async def get_app(id: PydanticObjectId, current_user: str = Depends(get_current_user)):
+    app = await Application.get(id)
+    if app and app.user_email == current_user:
+        return app
+    raise HTTPException(404, "Not found")
+
+@app.post("/api/applications", response_model=ApplicationDetail)
+async def create_app(app_data: ApplicationCreate, current_user: str = Depends(get_current_user)):
+    app = Application(**app_data.model_dump(), user_email=current_user)
+    await app.insert()
+    return app
 
 @app.delete("/api/applications/{id}")
 async def delete_app(id: PydanticObjectId, current_user: str = Depends(get_current_user)):
@@ -97,7 +158,7 @@ async def delete_app(id: PydanticObjectId, current_user: str = Depends(get_curre
         return {"message": "Deleted"}
     raise HTTPException(404, "Not found")
 
-@app.patch("/api/applications/{id}")
+@app.patch("/api/applications/{id}", response_model=ApplicationDetail)
 async def update_status(id: PydanticObjectId, status: str, current_user: str = Depends(get_current_user)):
     app = await Application.get(id)
     if app and app.user_email == current_user:
@@ -107,22 +168,73 @@ async def update_status(id: PydanticObjectId, status: str, current_user: str = D
     raise HTTPException(404, "Not found")
 
 # 3. AI FEATURES
-class AnalyzeRequest(BaseModel):
+class AnalyzeItem(BaseModel):
     resume_text: str
     job_description: str
 
+class AnalyzeRequest(AnalyzeItem):
+    application_id: Optional[PydanticObjectId] = None  # Enables resume embedding reuse
+
 @app.post("/api/ai/analyze")
 async def ai_analyze(req: AnalyzeRequest, current_user: str = Depends(get_current_user)):
-    analysis = await analyze_resume_ai(req.resume_text, req.job_description)
+    """
+    With an application_id, the resume embedding is stored on that application.
+    Later analyses of the same resume take match_score from embedding cosine
+    similarity (cosine * 100). That is a different scale from the Gemini ATS
+    score of the first analysis, so compare scores only within one mode.
+    """
+    if req.application_id is None:
+        return await analyze_resume_ai(req.resume_text, req.job_description, current_user)
+
+    app = await Application.get(req.application_id)
+    if not app or app.user_email != current_user:
+        raise HTTPException(404, "Not found")
+
+    # Same resume as last time: score via embeddings, short Gemini critique
+    resume_hash = hashlib.sha256(req.resume_text.encode()).hexdigest()
+    if app.resume_embedding and app.resume_hash == resume_hash:
+        return await analyze_with_embedding(app.resume_embedding, req.resume_text, req.job_description, current_user)
+
+    analysis, embedding = await asyncio.gather(
+        analyze_resume_ai(req.resume_text, req.job_description, current_user),
+        embed_text(req.resume_text),
+    )
+    if embedding is not None:
+        # Partial update so a status change made during the gather isn't clobbered
+        await app.set({Application.resume_hash: resume_hash, Application.resume_embedding: embedding})
     return analysis
 
+class BulkAnalyzeRequest(BaseModel):
+    items: list[AnalyzeItem]
+
+# Caps in-flight Gemini calls so a big batch doesn't blow the per-minute quota
+gemini_semaphore = asyncio.Semaphore(20)
+
+async def _analyze_limited(item: AnalyzeItem, user: str):
+    async with gemini_semaphore:
+        return await analyze_resume_ai(item.resume_text, item.job_description, user)
+
+@app.post("/api/ai/analyze/bulk")
+async def ai_analyze_bulk(req: BulkAnalyzeRequest, current_user: str = Depends(get_current_user)):
+    """
+    Analyze several (resume, JD) pairs concurrently. Clients submitting
+    multiple applications should prefer this over repeated /ai/analyze calls.
+    Results are returned in the same order as the input items.
+    """
+    if len(req.items) > 100:
+        raise HTTPException(400, "Maximum 100 items per batch")
+    results = await asyncio.gather(*(_analyze_limited(i, current_user) for i in req.items), return_exceptions=True)
+    return [
+        {"match_score": 0, "missing_keywords": [], "advice": f"Error: {r}"} if isinstance(r, Exception) else r
+        for r in results
+    ]
+
 class EmailRequest(BaseModel):
     job_description: str
 
 @app.post("/api/ai/cold-email")
 async def ai_email(req: EmailRequest, current_user: str = Depends(get_current_user)):
-    email_body = await generate_cold_email_ai(req.job_description)
-    return {"email": email_body}
+    return StreamingResponse(generate_cold_email_ai(req.job_description), media_type="text/plain")
 
 # 4. CHAT ASSISTANT
 class ChatRequest(BaseModel):
@@ -131,32 +243,40 @@ class ChatRequest(BaseModel):
 
 @app.post("/api/ai/chat")
 async def ai_chat(req: ChatRequest, current_user: str = Depends(get_current_user)):
-    response = await chat_with_gemini(req.message, context=req.context)
-    return {"reply": response}
+    return StreamingResponse(chat_with_gemini(req.message, context=req.context, user=current_user), media_type="text/plain")
 
 # 5. SMART AUTOMATION
 @app.get("/api/automation/run")
 async def run_automation(current_user: str = Depends(get_current_user)):
-    apps = await Application.find(Application.user_email == current_user).to_list()
+    today = datetime.utcnow()
     notifications = []
-    today = datetime.now()
-    
-    for app in apps:
-        if app.next_action_date:
-            diff = (app.next_action_date - today).total_seconds() / 3600
-            if 0 < diff < 24:
-                notifications.append({
-                    "id": str(app.id),
-                    "type": "alert",
-                    "message": f"🚀 Good luck! Interview with {app.company} is tomorrow!"
-                })
-
-        days_since_applied = (today - app.applied_date).days
-        if app.status == "Applied" and days_since_applied > 14:
-             notifications.append({
-                 "id": str(app.id),
-                 "type": "info",
-                 "message": f"💤 No news from {app.company} in 2 weeks. Time to follow up?"
-             })
+
+    # Filter in Mongo so only matching apps cross the wire
+    upcoming = await Application.find(
+        Application.user_email == current_user,
+        Application.next_action_date > today,
+        Application.next_action_date < today + timedelta(hours=24),
+    ).project(AppIdCompany).to_list()
+
+    for app in upcoming:
+        notifications.append({
+            "id": str(app.id),
+            "type": "alert",
+            "message": f"🚀 Good luck! Interview with {app.company} is tomorrow!"
+        })
+
+    # More than 14 full days since applying
+    stale = await Application.find(
+        Application.user_email == current_user,
+        Application.status == "Applied",
+        Application.applied_date <= today - timedelta(days=15),
+    ).project(AppIdCompany).to_list()
+
+    for app in stale:
+        notifications.append({
+            "id": str(app.id),
+            "type": "info",
+            "message": f"💤 No news from {app.company} in 2 weeks. Time to follow up?"
+        })
 
     return {"notifications": notifications}
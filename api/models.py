@@ -1,5 +1,6 @@
-from beanie import Document
-from pydantic import BaseModel, EmailStr
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pymongo import IndexModel
 from datetime import datetime
 from typing import Optional, List
 
@@ -7,10 +8,11 @@ from typing import Optional, List
 class User(Document):
     email: EmailStr
     hashed_password: str
-    created_at: datetime = datetime.now()
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Settings:
         name = "users"
+        indexes = [IndexModel([("email", 1)], unique=True)]
 
 class UserAuth(BaseModel):
     email: EmailStr
@@ -26,15 +28,61 @@ class Application(Document):
     company: str
     role: str
     status: str = "Applied"  # Applied, Interview, Offer, Rejected
-    applied_date: datetime = datetime.now()
+    applied_date: datetime = Field(default_factory=datetime.utcnow)
     job_description: Optional[str] = None
     resume_text: Optional[str] = None
     match_score: int = 0
     missing_keywords: List[str] = []
+    # Server-side only: never part of request/response schemas
+    resume_embedding: Optional[List[float]] = None  # Reused across re-analyses
+    resume_hash: Optional[str] = None  # sha256 of the resume text that was embedded
     
     # Reminder System
     next_action_date: Optional[datetime] = None  # e.g., Interview Date
     reminder_note: Optional[str] = None
 
     class Settings:
-        name = "applications"
\ No newline at end of file
+        name = "applications"
+        indexes = [
+            [("user_email", 1), ("next_action_date", 1)],
+            [("user_email", 1), ("status", 1), ("applied_date", 1)],
+        ]
+
+# Fields a client may set on an application
+class ApplicationCreate(BaseModel):
+    company: str
+    role: str
+    status: str = "Applied"
+    applied_date: datetime = Field(default_factory=datetime.utcnow)
+    job_description: Optional[str] = None
+    resume_text: Optional[str] = None
+    match_score: int = 0
+    missing_keywords: List[str] = []
+    next_action_date: Optional[datetime] = None
+    reminder_note: Optional[str] = None
+
+# Full application as returned to clients (no embedding)
+class ApplicationDetail(ApplicationCreate):
+    # Lets FastAPI read `id` off a returned Document as well as `_id` from Mongo
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: PydanticObjectId = Field(alias="_id")
+    user_email: str
+
+# Lean projection for the applications list (skips resume/JD text)
+class ApplicationListItem(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: PydanticObjectId = Field(alias="_id")
+    company: str
+    role: str
+    status: str
+    applied_date: datetime
+    next_action_date: Optional[datetime] = None
+
+# Lean projection for automation checks (only what notifications need)
+class AppIdCompany(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: PydanticObjectId = Field(alias="_id")
+    company: str
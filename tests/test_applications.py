@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from beanie import init_beanie
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+from api.index import app
+from api.auth import get_current_user
+from api.models import Application, User
+
+USER = "intern@example.com"
+
+
+@pytest.fixture
+def client():
+    asyncio.run(init_beanie(database=AsyncMongoMockClient()["test_db"], document_models=[Application, User]))
+    app.dependency_overrides[get_current_user] = lambda: USER
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_application_routes_return_detail_without_embedding(client):
+    created = client.post("/api/applications", json={"company": "Acme", "role": "Intern"})
+    assert created.status_code == 200
+    body = created.json()
+    assert body["user_email"] == USER
+    assert "resume_embedding" not in body
+    app_id = body["_id"]
+
+    fetched = client.get(f"/api/applications/{app_id}")
+    assert fetched.status_code == 200
+    assert fetched.json()["company"] == "Acme"
+    assert "resume_embedding" not in fetched.json()
+
+    updated = client.patch(f"/api/applications/{app_id}", params={"status": "Interview"})
+    assert updated.status_code == 200
+    assert updated.json()["status"] == "Interview"
+
+    listed = client.get("/api/applications")
+    assert listed.status_code == 200
+    assert [a["_id"] for a in listed.json()] == [app_id]
+
+
+def test_analyze_stores_embedding_without_clobbering_concurrent_update(client, monkeypatch):
+    import api.index as index
+
+    app_id = client.post("/api/applications", json={"company": "Acme", "role": "Intern"}).json()["_id"]
+
+    async def fake_analyze(resume_text, job_desc, user=""):
+        # A PATCH landing while Gemini is still working
+        stored = await Application.get(app_id)
+        await stored.set({Application.status: "Interview"})
+        return {"match_score": 80, "missing_keywords": [], "advice": "ok"}
+
+    async def fake_embed(text):
+        return [0.1] * 768
+
+    monkeypatch.setattr(index, "analyze_resume_ai", fake_analyze)
+    monkeypatch.setattr(index, "embed_text", fake_embed)
+
+    res = client.post("/api/ai/analyze", json={"resume_text": "r", "job_description": "jd", "application_id": app_id})
+    assert res.status_code == 200
+
+    stored = asyncio.run(Application.get(app_id))
+    assert stored.status == "Interview"
+    assert stored.resume_hash is not None
+    assert len(stored.resume_embedding) == 768